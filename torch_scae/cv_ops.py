@@ -17,10 +17,11 @@ import math
 import torch
 
 
+@torch.jit.script
 def geometric_transform(pose_tensor,
-                        similarity=False,
-                        nonlinear=True,
-                        as_matrix=False):
+                        similarity: bool = False,
+                        nonlinear: bool = True,
+                        as_matrix: bool = False):
     """Converts pose tensor into an affine or similarity transform.
 
     Args:
@@ -33,18 +34,21 @@ def geometric_transform(pose_tensor,
       [..., 3, 3] tensor if `as_matrix` else [..., 6] tensor.
     """
 
-    scale_x, scale_y, theta, shear, trans_x, trans_y = torch.split(pose_tensor,
-                                                                   1,
-                                                                   dim=-1)
+    params = torch.split(pose_tensor, 1, dim=-1)
+    scale_x, scale_y, theta, shear, trans_x, trans_y = (
+        params[0], params[1], params[2], params[3], params[4], params[5])
 
     if nonlinear:
-        scale_x, scale_y = (torch.sigmoid(t) + 1e-2 for t in (scale_x, scale_y))
+        scale_x = torch.sigmoid(scale_x) + 1e-2
+        scale_y = torch.sigmoid(scale_y) + 1e-2
 
-        trans_x, trans_y, shear = (torch.tanh(t * 5.)
-                                   for t in (trans_x, trans_y, shear))
-        theta *= 2. * math.pi
+        trans_x = torch.tanh(trans_x * 5.)
+        trans_y = torch.tanh(trans_y * 5.)
+        shear = torch.tanh(shear * 5.)
+        theta = theta * (2. * math.pi)
     else:
-        scale_x, scale_y = (abs(t) + 1e-2 for t in (scale_x, scale_y))
+        scale_x = torch.abs(scale_x) + 1e-2
+        scale_y = torch.abs(scale_y) + 1e-2
 
     c, s = torch.cos(theta), torch.sin(theta)
 
@@ -68,7 +72,7 @@ def geometric_transform(pose_tensor,
     if as_matrix:
         shape = list(pose.shape[:-1])
         shape += [2, 3]
-        pose = pose.view(*shape)
+        pose = pose.view(shape)
         zeros = torch.zeros_like(pose[..., :1, 0])
         last = torch.stack([zeros, zeros, zeros + 1], -1)
         pose = torch.cat([pose, last], -2)
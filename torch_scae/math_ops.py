@@ -15,7 +15,7 @@
 import torch
 
 
-def log_safe(tensor, eps=1e-16):
+def log_safe(tensor, eps: float = 1e-16):
     is_zero = tensor < eps
     tensor = torch.where(is_zero, torch.ones_like(tensor), tensor)
     tensor = torch.where(is_zero, torch.zeros_like(tensor) - 1e8, torch.log(tensor))
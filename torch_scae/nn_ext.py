@@ -12,6 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
+from typing import Optional
+
+import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
@@ -31,6 +35,79 @@ def MLP(sizes, activation=nn.ReLU, activate_final=True, bias=True):
     return nn.Sequential(*layers)
 
 
+class GroupedMLP(nn.Module):
+    """A group of independent MLPs which are evaluated in a single pass.
+
+    Each layer keeps the weights of all groups stacked into a tensor of shape
+    (G, in, out), so that an input of shape (B, G, in) is processed with one
+    batched matrix multiplication instead of G separate ones.
+    """
+
+    def __init__(self, n_groups, sizes, activation=nn.ReLU,
+                 activate_final=True, bias=True):
+        super().__init__()
+        n = len(sizes)
+        assert n >= 2, "There must be at least two sizes"
+
+        self.n_groups = n_groups
+        self.sizes = list(sizes)
+        self.activation = activation()
+        self.activate_final = activate_final
+        # ReLU is applied inside the scripted layer, other activations eagerly
+        self._fuse_relu = isinstance(self.activation, nn.ReLU)
+
+        self.weights = nn.ParameterList([
+            nn.Parameter(torch.empty(n_groups, sizes[j], sizes[j + 1]))
+            for j in range(n - 1)
+        ])
+        if bias:
+            self.biases = nn.ParameterList([
+                nn.Parameter(torch.empty(n_groups, sizes[j + 1]))
+                for j in range(n - 1)
+            ])
+        else:
+            self.biases = None
+
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        # same initialization as nn.Linear, applied to each group separately
+        for j, weight in enumerate(self.weights):
+            for g in range(self.n_groups):
+                nn.init.kaiming_uniform_(weight[g].t(), a=math.sqrt(5))
+            if self.biases is not None:
+                bound = 1 / math.sqrt(self.sizes[j])
+                nn.init.uniform_(self.biases[j], -bound, bound)
+
+    def forward(self, x):  # (B, G, in)
+        x = x.transpose(0, 1)  # (G, B, in)
+        n_layers = len(self.weights)
+        for j in range(n_layers):
+            bias = None if self.biases is None else self.biases[j]
+            activate = self.activate_final or j < n_layers - 1
+            x = _grouped_linear(x, self.weights[j], bias,
+                                activate and self._fuse_relu)
+            if activate and not self._fuse_relu:
+                x = self.activation(x)
+        return x.transpose(0, 1)  # (B, G, out)
+
+
+@torch.jit.script
+def _grouped_linear(x,
+                    weight,
+                    bias: Optional[torch.Tensor],
+                    relu: bool):
+    """Scripted layer of GroupedMLP, (G, B, in) -> (G, B, out)."""
+    if bias is not None:
+        # bias is added by the same kernel as the matmul
+        x = torch.baddbmm(bias.unsqueeze(1), x, weight)
+    else:
+        x = torch.bmm(x, weight)
+    if relu:
+        x = torch.relu(x)
+    return x
+
+
 def Conv2dStack(in_channels,
                 out_channels,
                 kernel_sizes,
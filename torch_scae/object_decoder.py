@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import numpy as np
+import math
+from typing import Optional
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from monty.collections import AttrDict
-from torch.distributions import Bernoulli, LogisticNormal, Normal
 
 from torch_scae import cv_ops, math_ops
 from torch_scae import nn_ext
@@ -25,6 +26,106 @@ from torch_scae.general_utils import prod
 from torch_scae.math_ops import l2_loss
 
 
+@torch.jit.script
+def _finalize(presence_logit_per_caps,
+              presence_logit_per_vote,
+              scale_per_vote,
+              caps_exist: Optional[torch.Tensor],
+              noise_caps: Optional[torch.Tensor],
+              noise_vote: Optional[torch.Tensor],
+              parent_presence: Optional[torch.Tensor],
+              learn_vote_scale: bool):
+    """Computes presence probabilities and vote scales from raw capsule params.
+
+    Noise is sampled by the caller so that only pointwise ops are scripted,
+    which lets them be fused into a few kernels.
+    """
+    # dropped capsules get a very low presence logit; None without dropout
+    if caps_exist is not None:
+        presence_logit_per_caps = presence_logit_per_caps \
+                                  + math_ops.log_safe(caps_exist)
+    if noise_caps is not None:
+        presence_logit_per_caps = presence_logit_per_caps + noise_caps
+    if noise_vote is not None:
+        presence_logit_per_vote = presence_logit_per_vote + noise_vote
+
+    if parent_presence is not None:
+        presence_per_caps = parent_presence
+    else:
+        presence_per_caps = torch.sigmoid(presence_logit_per_caps)
+
+    # (B, O, V)
+    vote_presence = presence_per_caps * torch.sigmoid(presence_logit_per_vote)
+
+    # (B, O, V)
+    if learn_vote_scale:
+        # for numerical stability
+        scale_per_vote = F.softplus(scale_per_vote + .5) + 1e-2
+    else:
+        scale_per_vote = torch.ones_like(scale_per_vote)
+
+    return (presence_logit_per_caps, presence_logit_per_vote,
+            vote_presence, scale_per_vote)
+
+
+@torch.jit.script
+def gaussian_ll_sum(x, vote, scale):
+    """Log-likelihood of parts under isotropic Gaussian votes.
+
+    Args:
+      x: Tensor of shape [B, M, P].
+      vote: Tensor of shape [B, O, M, P].
+      scale: Tensor of shape [B, O, M].
+
+    Returns:
+      Tensor of shape [B, O, M], log-likelihoods summed over the last dim.
+    """
+    dim = x.shape[-1]
+    z = (x.unsqueeze(1) - vote) / scale.unsqueeze(-1)  # (B, O, M, P)
+    return -0.5 * z.pow(2).sum(-1) \
+           - dim * (torch.log(scale) + 0.5 * math.log(2 * math.pi))
+
+
+@torch.jit.script
+def _mixture_log_prob(mixing_logit,
+                      vote_log_prob,
+                      presence: Optional[torch.Tensor],
+                      compute_posterior: bool = True):
+    """Computes the mixture log-likelihood and the posterior mixing probs.
+
+    Args:
+      mixing_logit: Tensor of shape [B, O+1, M].
+      vote_log_prob: Tensor of shape [B, O+1, M].
+      presence: None or tensor of shape [B, M].
+      compute_posterior: bool; posterior mixing probs are None if False.
+
+    Returns:
+      Posterior mixing logits [B, O+1, M], scalar log-likelihood and
+      posterior mixing probabilities [B, O+1, M].
+    """
+    # joint log-probability of points and mixture components, computed once
+    # and shared by the likelihood and the posterior. (B, O + 1, M)
+    joint_logit = mixing_logit + vote_log_prob
+
+    # (B, M)
+    log_normalizer = joint_logit.logsumexp(1)
+
+    if presence is not None:
+        mixture_log_prob_per_point = log_normalizer * presence.float()
+    else:
+        mixture_log_prob_per_point = log_normalizer
+
+    # scalar
+    mixture_log_prob_per_batch = mixture_log_prob_per_point.sum(1).mean()
+
+    # softmax which reuses the normalizer of the likelihood. (B, O + 1, M)
+    posterior_mixing_prob: Optional[torch.Tensor] = None
+    if compute_posterior:
+        posterior_mixing_prob = torch.exp(joint_logit - log_normalizer.unsqueeze(1))
+
+    return joint_logit, mixture_log_prob_per_batch, posterior_mixing_prob
+
+
 class CapsuleLayer(nn.Module):
     """Implementation of a capsule layer."""
 
@@ -58,7 +159,7 @@ class CapsuleLayer(nn.Module):
             capsules' votes.
           allow_deformations: bool, allows input-dependent deformations of capsule-part
             relationships.
-          noise_type: 'normal', 'logistic' or None; noise type injected into
+          noise_type: 'uniform', 'logistic' or None; noise type injected into
             presence logits.
           noise_scale: float >= 0. scale parameters for the noise.
           similarity_transform: boolean; uses similarity transforms if True.
@@ -73,6 +174,8 @@ class CapsuleLayer(nn.Module):
         self.n_votes = n_votes
         self.learn_vote_scale = learn_vote_scale
         self.allow_deformations = allow_deformations
+        if noise_type not in (None, 'uniform', 'logistic'):
+            raise ValueError(f'Invalid noise type: {noise_type}')
         self.noise_type = noise_type
         self.noise_scale = noise_scale
 
@@ -83,10 +186,7 @@ class CapsuleLayer(nn.Module):
     def _build(self):
         # Use separate parameters to do predictions for different capsules.
         sizes = [self.dim_feature] + self.hidden_sizes + [self.dim_caps]
-        self.mlps = nn.ModuleList([
-            nn_ext.MLP(sizes=sizes)
-            for _ in range(self.n_caps)
-        ])
+        self.mlp = nn_ext.GroupedMLP(n_groups=self.n_caps, sizes=sizes)
 
         self.output_shapes = (
             [self.n_votes, self.n_transform_params],  # OPR-dynamic
@@ -101,15 +201,14 @@ class CapsuleLayer(nn.Module):
         # we don't use bias in the output layer in order to separate the static
         # and dynamic parts of the OP
         sizes = [self.dim_caps + 1] + self.hidden_sizes + [self.n_outputs]
-        self.caps_mlps = nn.ModuleList([
-            nn_ext.MLP(sizes=sizes, bias=False)
-            for _ in range(self.n_caps)
-        ])
+        self.caps_mlp = nn_ext.GroupedMLP(n_groups=self.n_caps, sizes=sizes,
+                                          bias=False)
 
-        self.caps_bias_list = nn.ParameterList([
-            nn.Parameter(torch.zeros(1, self.n_caps, *shape), requires_grad=True)
-            for shape in self.output_shapes[1:]
-        ])
+        # biases of all outputs except OPR-dynamic, concatenated
+        self.caps_bias = nn.Parameter(
+            torch.zeros(1, self.n_caps, sum(self.splits[1:])),
+            requires_grad=True
+        )
 
         # constant object-part relationship matrices, OPR-static
         self.cpr_static = nn.Parameter(
@@ -127,56 +226,55 @@ class CapsuleLayer(nn.Module):
         Returns:
           A bunch of stuff.
         """
-        device = feature.device
-
         batch_size = feature.shape[0]  # B
 
         # Predict capsule and additional params from the input encoding.
-        # [B, O, D]
-
-        caps_feature_list = feature.unbind(1)  # [(B, F)] * O
-        caps_param_list = [self.mlps[i](caps_feature_list[i])
-                           for i in range(self.n_caps)]  # [(B, D)] * O
-        del feature, caps_feature_list
-        raw_caps_param = torch.stack(caps_param_list, 1)  # (B, O, D)
-        del caps_param_list
+        raw_caps_param = self.mlp(feature)  # (B, O, D)
+        del feature
 
+        # created directly on the right device and with the right dtype
+        # (B, O, 1)
         if self.caps_dropout_rate == 0.0:
-            caps_exist = torch.ones(batch_size, self.n_caps, 1)  # (B, O, 1)
+            caps_exist = raw_caps_param.new_ones(batch_size, self.n_caps, 1)
         else:
-            pmf = Bernoulli(1. - self.caps_dropout_rate)
-            caps_exist = pmf.sample((batch_size, self.n_caps, 1))  # (B, O, 1)
-        caps_exist = caps_exist.to(device)
+            caps_exist = raw_caps_param.new_empty(batch_size, self.n_caps, 1) \
+                .bernoulli_(1. - self.caps_dropout_rate)
 
         caps_param = torch.cat([raw_caps_param, caps_exist], -1)  # (B, O, D+1)
-        del raw_caps_param, caps_exist
-
-        caps_eparam_list = caps_param.unbind(1)  # [(B, D+1)] * O
-        all_param_list = [self.caps_mlps[i](caps_eparam_list[i])
-                          for i in range(self.n_caps)]  # [(B, A)] * O
-        del caps_eparam_list
-        all_param = torch.stack(all_param_list, 1)  # (B, O, A)
-        del all_param_list
-        all_param_split_list = torch.split(all_param, self.splits, -1)
+        del raw_caps_param
+
+        all_param = self.caps_mlp(caps_param)  # (B, O, A)
+        del caps_param
+
+        # add bias to all outputs except OPR-dynamic at once
+        cpr_dynamic, biased_param = torch.split(
+            all_param, [self.splits[0], self.n_outputs - self.splits[0]], -1)
+        biased_param = biased_param + self.caps_bias
+        del all_param
+
+        # (B, O, V, P), (B, O, 1, P), (B, O, 1), (B, O, V), (B, O, V)
+        all_param_split_list = [cpr_dynamic] \
+                               + list(torch.split(biased_param, self.splits[1:], -1))
         result = [t.view(batch_size, self.n_caps, *s)
                   for (t, s) in zip(all_param_split_list, self.output_shapes)]
-        del all_param
+        del cpr_dynamic, biased_param
         del all_param_split_list
 
         # add up static and dynamic object part relationship
-        cpr_dynamic = result[0]  # (B, O, V, P)
-        if not self.allow_deformations:
-            cpr_dynamic = torch.zeros_like(cpr_dynamic)
-        cpr_dynamic_reg_loss = l2_loss(cpr_dynamic) / batch_size
-        cpr = self._make_transform(cpr_dynamic + self.cpr_static)  # (B, O, V, 3, 3)
-        del cpr_dynamic
-
-        # add bias to all remaining outputs
+        if self.allow_deformations:
+            cpr_dynamic = result[0]  # (B, O, V, P)
+            cpr_dynamic_reg_loss = l2_loss(cpr_dynamic) / batch_size
+            cpr = cpr_dynamic + self.cpr_static  # (B, O, V, P)
+            del cpr_dynamic
+        else:
+            # the dynamic part is dropped, so it neither contributes nor
+            # has to be regularized
+            cpr_dynamic_reg_loss = self.cpr_static.new_zeros(())
+            cpr = self.cpr_static  # (1, O, V, P)
+        cpr = self._make_transform(cpr)  # (B, O, V, 3, 3) or (1, O, V, 3, 3)
+
         # (B, O, 1, P), (B, O, 1), (B, O, V), (B, O, V)
-        cvr, presence_logit_per_caps, presence_logit_per_vote, scale_per_vote = [
-            t + bias
-            for (t, bias) in zip(result[1:], self.caps_bias_list)
-        ]
+        cvr, presence_logit_per_caps, presence_logit_per_vote, scale_per_vote = result[1:]
         del result
 
         # this is for hierarchical
@@ -186,45 +284,23 @@ class CapsuleLayer(nn.Module):
         else:
             cvr = parent_transform
 
-        cvr_per_vote = cvr.repeat(1, 1, self.n_votes, 1, 1)  # (B, O, V, 3, 3)
-        # PVR = OVR x OPR
-        vote = torch.matmul(cvr_per_vote, cpr)  # (B, O, V, 3, 3)
-        del cvr_per_vote, cpr
-
-        if self.caps_dropout_rate > 0.0:
-            presence_logit_per_caps = presence_logit_per_caps \
-                                      + math_ops.log_safe(caps_exist)
-
-        def add_noise(tensor):
-            """Adds noise to tensors."""
-            if self.noise_type == 'uniform':
-                noise = (torch.rand_like(tensor) - 0.5) * self.noise_scale
-            elif self.noise_type == 'logistic':
-                pdf = LogisticNormal(0., self.noise_scale)
-                noise = pdf.sample(tensor.shape)
-            elif not self.noise_type:
-                noise = torch.tensor([0.0])
-            else:
-                raise ValueError(f'Invalid noise type: {self.noise_type}')
-            return tensor + noise.to(device)
-
-        presence_logit_per_caps = add_noise(presence_logit_per_caps)  # (B, O, 1)
-        presence_logit_per_vote = add_noise(presence_logit_per_vote)  # (B, O, V)
-
-        if parent_presence is not None:
-            presence_per_caps = parent_presence
-        else:
-            presence_per_caps = torch.sigmoid(presence_logit_per_caps)
-
-        vote_presence = presence_per_caps * torch.sigmoid(presence_logit_per_vote)  # (B, O, V)
-        del presence_per_caps
-
-        # (B, O, V)
-        if self.learn_vote_scale:
-            # for numerical stability
-            scale_per_vote = F.softplus(scale_per_vote + .5) + 1e-2
-        else:
-            scale_per_vote = torch.ones_like(scale_per_vote, device=device)
+        # PVR = OVR x OPR, OVR is broadcast along the votes
+        vote = torch.matmul(cvr, cpr)  # (B, O, V, 3, 3)
+        del cvr, cpr
+
+        # (B, O, 1), (B, O, V), (B, O, V), (B, O, V)
+        (presence_logit_per_caps, presence_logit_per_vote,
+         vote_presence, scale_per_vote) = _finalize(
+            presence_logit_per_caps,
+            presence_logit_per_vote,
+            scale_per_vote,
+            caps_exist if self.caps_dropout_rate > 0.0 else None,
+            self._sample_noise(presence_logit_per_caps),
+            self._sample_noise(presence_logit_per_vote),
+            parent_presence,
+            self.learn_vote_scale,
+        )
+        del caps_exist
 
         return AttrDict(
             vote=vote,  # (B, O, V, 3, 3)
@@ -235,6 +311,16 @@ class CapsuleLayer(nn.Module):
             cpr_dynamic_reg_loss=cpr_dynamic_reg_loss,
         )
 
+    def _sample_noise(self, tensor):
+        """Samples noise to be added to tensors, None if there is no noise."""
+        if self.noise_type == 'uniform':
+            return torch.rand_like(tensor).sub_(0.5).mul_(self.noise_scale)
+        elif self.noise_type == 'logistic':
+            # inverse CDF of the logistic distribution: scale * logit(u)
+            u = torch.rand_like(tensor).clamp_(min=torch.finfo(tensor.dtype).tiny)
+            return u.div_(1. - u).log_().mul_(self.noise_scale)
+        return None
+
     def _make_transform(self, params):
         return cv_ops.geometric_transform(params, self.similarity_transform,
                                           nonlinear=True, as_matrix=True)
@@ -243,6 +329,9 @@ class CapsuleLayer(nn.Module):
 class CapsuleLikelihood:
     """Capsule voting mechanism."""
 
+    # log-likelihood and mixing logit of the dummy vote
+    dummy_log_prob = math.log(0.01)
+
     def __init__(self, vote, scale, vote_presence, dummy_vote):
         super().__init__()
         self.n_caps = vote.shape[1]  # O
@@ -251,113 +340,94 @@ class CapsuleLikelihood:
         self.vote_presence = vote_presence  # (B, O, M)
         self.dummy_vote = dummy_vote  # (1, 1, M, P)
 
-    def _get_pdf(self, votes, scales):
-        return Normal(votes, scales)
-
-    def __call__(self, x, presence=None):  # (B, M, P), (B, M)
-        device = x.device
+    def __call__(self, x, presence=None, compute_aux=True):  # (B, M, P), (B, M)
+        """
+        Args:
+          x: Tensor of part poses of shape [B, M, P].
+          presence: None or tensor of shape [B, M].
+          compute_aux: bool; if False, only `log_prob` and `mixing_logit` are
+            computed, which is enough for the likelihood loss.
 
+        Returns:
+          A bunch of stuff.
+        """
         batch_size, n_input_points, dim_in = x.shape  # B, M, P
 
         # since scale is a per-caps scalar and we have one vote per capsule
-        vote_component_pdf = self._get_pdf(self.vote,
-                                           self.scale.unsqueeze(-1))
-
-        # expand input along caps dimensions
-        expanded_x = x.unsqueeze(1)  # (B, 1, M, P)
-        vote_log_prob_per_dim = vote_component_pdf.log_prob(expanded_x)  # (B, O, M, P)
-        vote_log_prob = vote_log_prob_per_dim.sum(-1)  # (B, O, M)
-        del x, expanded_x, vote_log_prob_per_dim
+        vote_log_prob = gaussian_ll_sum(x, self.vote, self.scale)  # (B, O, M)
+        del x
 
-        # (B, 1, M)
-        dummy_vote_log_prob = torch.zeros(
-            batch_size, 1, n_input_points, device=device) + np.log(0.01)
+        # (B, 1, M), a broadcast view of a single element shared by both the
+        # dummy vote log-likelihood and the dummy mixing logit
+        dummy_log_prob = vote_log_prob.new_full((1, 1, 1), self.dummy_log_prob) \
+            .expand(batch_size, 1, n_input_points)
 
         # p(x_m | k, m)
-        vote_log_prob = torch.cat([vote_log_prob, dummy_vote_log_prob], 1)  # (B, O+1, M)
-        del dummy_vote_log_prob
-
-        #
-        dummy_logit = torch.full((batch_size, 1, n_input_points),
-                                 fill_value=np.log(0.01), device=device)
+        vote_log_prob = torch.cat([vote_log_prob, dummy_log_prob], 1)  # (B, O+1, M)
 
-        mixing_logit = math_ops.log_safe(self.vote_presence)  # (B, O, M)
-        mixing_logit = torch.cat([mixing_logit, dummy_logit], 1)  # (B, O+1, M)
-        mixing_log_prob = mixing_logit - mixing_logit.logsumexp(1, keepdim=True)  # (B, O+1, M)
+        caps_mixing_logit = math_ops.log_safe(self.vote_presence)  # (B, O, M)
+        mixing_logit = torch.cat([caps_mixing_logit, dummy_log_prob], 1)  # (B, O+1, M)
+        del dummy_log_prob
 
-        # mask for votes which are better than dummy vote
-        vote_presence_binary = (mixing_logit[:, :-1] > mixing_logit[:, -1:]).float()  # (B, O, M)
-
-        # (B, O + 1, M)
-        posterior_mixing_logits_per_point = mixing_logit + vote_log_prob
+        (posterior_mixing_logits_per_point,
+         mixture_log_prob_per_batch,
+         posterior_mixing_prob) = _mixture_log_prob(mixing_logit, vote_log_prob,
+                                                    presence, compute_aux)
         del vote_log_prob
 
-        # (B, M)
-        mixture_log_prob_per_point = posterior_mixing_logits_per_point.logsumexp(1)
-
-        if presence is not None:
-            mixture_log_prob_per_point = mixture_log_prob_per_point * presence.float()
+        if not compute_aux:
+            return AttrDict(
+                log_prob=mixture_log_prob_per_batch,
+                mixing_logit=mixing_logit,
+            )
 
-        # (B,)
-        mixture_log_prob_per_example = mixture_log_prob_per_point.sum(1)
-        del mixture_log_prob_per_point
+        mixing_log_prob = F.log_softmax(mixing_logit, 1)  # (B, O+1, M)
 
-        # scalar
-        mixture_log_prob_per_batch = mixture_log_prob_per_example.mean()
-        del mixture_log_prob_per_example
+        # mask for votes which are better than dummy vote, kept as bool;
+        # the dummy logit is a constant, so compare against it directly
+        vote_presence_binary = caps_mixing_logit > self.dummy_log_prob  # (B, O, M)
+        del caps_mixing_logit
 
         # winner object index per part
         winning_vote_idx = torch.argmax(
             posterior_mixing_logits_per_point[:, :-1], 1)  # (B, M)
 
-        batch_idx = torch.arange(batch_size, device=device).unsqueeze(1)  # (B, 1)
-        batch_idx = batch_idx.repeat(1, n_input_points)  # (B, M)
-
-        point_idx = torch.arange(n_input_points, device=device).unsqueeze(0)  # (1, M)
-        point_idx = point_idx.repeat(batch_size, 1)  # (B, M)
-
-        idx = torch.stack([batch_idx, winning_vote_idx, point_idx], -1)
-        del batch_idx
-        del point_idx
-
         # (B, M, P)
-        winning_vote = self.vote[idx[:, :, 0], idx[:, :, 1], idx[:, :, 2]]
+        winning_vote = self.vote.gather(
+            1, winning_vote_idx[:, None, :, None].expand(-1, -1, -1, dim_in)
+        ).squeeze(1)
         assert winning_vote.shape == (batch_size, n_input_points, dim_in)
 
         # (B, M)
-        winning_presence = \
-            self.vote_presence[idx[:, :, 0], idx[:, :, 1], idx[:, :, 2]]
+        winning_presence = self.vote_presence.gather(
+            1, winning_vote_idx.unsqueeze(1)
+        ).squeeze(1)
         assert winning_presence.shape == (batch_size, n_input_points)
-        del idx
 
-        # is winner capsule or dummy
-        is_from_capsule = winning_vote_idx // n_input_points
+        # capsule of the winning vote; every capsule casts exactly one vote
+        # per part, so the vote index already is the capsule index
+        is_from_capsule = winning_vote_idx
 
         # Soft winner. START
-        # (B, O+1, M)
-        posterior_mixing_prob = F.softmax(posterior_mixing_logits_per_point, 1)
         del posterior_mixing_logits_per_point
 
-        dummy_vote = self.dummy_vote.repeat(batch_size, 1, 1, 1)  # (B, 1, M, P)
-        dummy_presence = torch.zeros([batch_size, 1, n_input_points], device=device)
-
-        votes = torch.cat((self.vote, dummy_vote), 1)  # (B, O+1, M, P)
-        vote_presence = torch.cat([self.vote_presence, dummy_presence], 1)  # (B, O+1, M)
-        del dummy_vote
-        del dummy_presence
+        # (B, O, M), (B, 1, M)
+        caps_posterior_prob, dummy_posterior_prob = posterior_mixing_prob.split(
+            [self.n_caps, 1], 1)
 
+        # the dummy vote is broadcast instead of being tiled and concatenated
         # (B, M, P)
-        soft_winner_vote = torch.sum(posterior_mixing_prob.unsqueeze(-1) * votes, 1)
+        soft_winner_vote = torch.einsum('bom,bomp->bmp', caps_posterior_prob, self.vote) \
+                           + (dummy_posterior_prob.unsqueeze(-1) * self.dummy_vote).squeeze(1)
         assert soft_winner_vote.shape == (batch_size, n_input_points, dim_in)
 
+        # the dummy vote has zero presence and does not contribute
         # (B, M)
-        soft_winner_presence = torch.sum(posterior_mixing_prob * vote_presence, 1)
+        soft_winner_presence = torch.einsum('bom,bom->bm',
+                                            caps_posterior_prob, self.vote_presence)
         assert soft_winner_presence.shape == (batch_size, n_input_points)
         # Soft winner. END
 
-        # (B, O, M)
-        posterior_mixing_prob = posterior_mixing_prob[:, :-1]
-
         return AttrDict(
             log_prob=mixture_log_prob_per_batch,
             vote_presence_binary=vote_presence_binary,
@@ -365,7 +435,7 @@ class CapsuleLikelihood:
             winner_presence=winning_presence,
             soft_winner=soft_winner_vote,
             soft_winner_presence=soft_winner_presence,
-            posterior_mixing_prob=posterior_mixing_prob,
+            posterior_mixing_prob=caps_posterior_prob,
             mixing_log_prob=mixing_log_prob,
             mixing_logit=mixing_logit,
             is_from_capsule=is_from_capsule,
@@ -393,13 +463,16 @@ class CapsuleObjectDecoder(nn.Module):
     def forward(self,
                 obj_encoding: torch.Tensor,
                 part_pose: torch.Tensor,
-                part_presence: torch.Tensor = None):
+                part_presence: torch.Tensor = None,
+                compute_aux: bool = True):
         """
         Args:
           obj_encoding: Tensor of shape [B, O, D].
           part_pose: Tensor of shape [B, M, P]
           part_presence: Tensor of shape [B, M] or None; if it exists, it
             indicates which input parts exist.
+          compute_aux: bool; if False, winners and posteriors are not
+            computed and only the log-likelihood of the parts is returned.
 
         Returns:
           A bunch of stuff.
@@ -409,8 +482,9 @@ class CapsuleObjectDecoder(nn.Module):
 
         res = self.capsule_layer(obj_encoding)
         # remove homogeneous coord row from transformation matrices
-        # and flatten last two dimensions
-        res.vote = res.vote[..., :-1, :].view(batch_size, n_caps, n_votes, -1)
+        # and flatten last two dimensions; the rows are adjacent in memory,
+        # so this stays a view of the (B, O, V, 3, 3) votes
+        res.vote = res.vote[..., :-1, :].reshape(batch_size, n_caps, n_votes, -1)
         # compute capsule presence by maximum part vote
         res.caps_presence = res.vote_presence.max(-1)[0]
 
@@ -421,7 +495,8 @@ class CapsuleObjectDecoder(nn.Module):
             vote_presence=res.vote_presence,
             dummy_vote=self.dummy_vote
         )
-        ll_res = likelihood(part_pose, presence=part_presence)
+        ll_res = likelihood(part_pose, presence=part_presence,
+                            compute_aux=compute_aux)
         res.update(ll_res)
         del likelihood
 
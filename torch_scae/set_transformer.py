@@ -21,29 +21,43 @@ import torch.nn.functional as F
 
 # Attention blocks code credits https://github.com/juho-lee/set_transformer
 
+# fused attention is only available in recent versions of PyTorch
+_HAS_SDPA = hasattr(F, 'scaled_dot_product_attention')
+
+
 def qkv_attention(queries, keys, values, presence=None):
     """
     Transformer-like self-attention.
 
     Args:
-      queries: Tensor of shape [B, N, d_k].
-      keys: Tensor of shape [B, M, d_k].
-      values: : Tensor of shape [B, M, d_v].
-      presence: None or tensor of shape [B, M].
+      queries: Tensor of shape [..., N, d_k].
+      keys: Tensor of shape [..., M, d_k].
+      values: : Tensor of shape [..., M, d_v].
+      presence: None or tensor of shape [..., M].
 
     Returns:
-      Tensor of shape [B, N, d_v]
+      Tensor of shape [..., N, d_v]
     """
     d_k = queries.shape[-1]
 
-    # [B, N, d_k] x [B, d_k, M] = [B, N, M]
-    routing = torch.matmul(queries, keys.transpose(1, 2))
+    if _HAS_SDPA:
+        # fused kernel which does not materialize the routing matrix
+        attn_mask = None
+        if presence is not None:
+            # same additive mask as below, scaled since SDPA adds it after
+            # scaling the logits
+            attn_mask = (presence.unsqueeze(-2) - 1.) * (1e32 / math.sqrt(d_k))
+        return F.scaled_dot_product_attention(queries, keys, values,
+                                              attn_mask=attn_mask)
+
+    # [..., N, d_k] x [..., d_k, M] = [..., N, M]
+    routing = torch.matmul(queries, keys.transpose(-2, -1))
     if presence is not None:
         routing -= (1. - presence.unsqueeze(-2)) * 1e32
     routing = F.softmax(routing / np.sqrt(d_k), -1)
 
     # every output is a linear combination of all inputs
-    # [B, N, M] x [B, M, d_v] = [B, N, d_v]
+    # [..., N, M] x [..., M, d_v] = [..., N, d_v]
     return torch.matmul(routing, values)
 
 
@@ -59,12 +73,43 @@ class MultiHeadQKVAttention(nn.Module):
         # make sure that dimension of vectors is divisible by n_heads
         d_k_p = int(math.ceil(d_k / n_heads)) * n_heads
         d_v_p = int(math.ceil(d_v / n_heads)) * n_heads
-
-        self.q_projector = nn.Linear(d_k, d_k_p)
-        self.k_projector = nn.Linear(d_k, d_k_p)
-        self.v_projector = nn.Linear(d_v, d_v_p)
+        self.d_k_p = d_k_p
+        self.d_v_p = d_v_p
+
+        # when queries, keys and values have the same dimension, their
+        # projections are stacked into a single layer, so that inputs which
+        # are shared (e.g. in self-attention) are projected at once
+        self.fuse_qkv = d_k == d_v
+        if self.fuse_qkv:
+            self.qkv_projector = nn.Linear(d_k, 2 * d_k_p + d_v_p)
+        else:
+            self.q_projector = nn.Linear(d_k, d_k_p)
+            self.k_projector = nn.Linear(d_k, d_k_p)
+            self.v_projector = nn.Linear(d_v, d_v_p)
         self.o_projector = nn.Linear(d_v_p, d_v)
 
+    def _project(self, queries, keys, values):
+        if not self.fuse_qkv:
+            return (self.q_projector(queries),
+                    self.k_projector(keys),
+                    self.v_projector(values))
+
+        d_k_p, d_v_p = self.d_k_p, self.d_v_p
+        if queries is keys and keys is values:
+            qkv_p = self.qkv_projector(queries)
+            return qkv_p.split([d_k_p, d_k_p, d_v_p], -1)
+
+        weight = self.qkv_projector.weight
+        bias = self.qkv_projector.bias
+        q_p = F.linear(queries, weight[:d_k_p], bias[:d_k_p])
+        if keys is values:
+            kv_p = F.linear(keys, weight[d_k_p:], bias[d_k_p:])
+            k_p, v_p = kv_p.split([d_k_p, d_v_p], -1)
+        else:
+            k_p = F.linear(keys, weight[d_k_p:2 * d_k_p], bias[d_k_p:2 * d_k_p])
+            v_p = F.linear(values, weight[2 * d_k_p:], bias[2 * d_k_p:])
+        return q_p, k_p, v_p
+
     def forward(self, queries, keys, values, presence=None):
         """
         Multi-head transformer-like self-attention.
@@ -87,20 +132,19 @@ class MultiHeadQKVAttention(nn.Module):
         M, d_v = values.shape[1:]
         H = self.n_heads
 
-        q_p = self.q_projector(queries)  # (B, N, d_k_p)
-        k_p = self.k_projector(keys)  # (B, M, d_k_p)
-        v_p = self.v_projector(values)  # (B, M, d_v_p)
+        # (B, N, d_k_p), (B, M, d_k_p), (B, M, d_v_p)
+        q_p, k_p, v_p = self._project(queries, keys, values)
         del queries, keys, values
 
-        q = q_p.view(B, N, H, -1).permute(2, 0, 1, 3).contiguous().view(H * B, N, -1)  # (H*B, N, d_k_s)
-        k = k_p.view(B, M, H, -1).permute(2, 0, 1, 3).contiguous().view(H * B, M, -1)  # (H*B, M, d_k_s)
-        v = v_p.view(B, M, H, -1).permute(2, 0, 1, 3).contiguous().view(H * B, M, -1)  # (H*B, M, d_v_s)
+        q = q_p.view(B, N, H, -1).transpose(1, 2)  # (B, H, N, d_k_s)
+        k = k_p.view(B, M, H, -1).transpose(1, 2)  # (B, H, M, d_k_s)
+        v = v_p.view(B, M, H, -1).transpose(1, 2)  # (B, H, M, d_v_s)
 
         if presence is not None:
-            presence = presence.repeat(self.n_heads, 1)
+            presence = presence.unsqueeze(1)  # (B, 1, M)
 
-        o = qkv_attention(q, k, v, presence)  # (H*B, N, d_v_s)
-        o = o.view(H, B, N, -1).permute(1, 2, 0, 3).contiguous().view(B, N, -1)
+        o = qkv_attention(q, k, v, presence)  # (B, H, N, d_v_s)
+        o = o.transpose(1, 2).reshape(B, N, -1)  # (B, N, d_v_p)
         return self.o_projector(o)  # (B, N, d_v)
 
 
@@ -154,7 +198,7 @@ class ISAB(nn.Module):
 
     def forward(self, x, presence=None):
         batch_size = x.shape[0]
-        h = self.mab0(self.I.repeat(batch_size, 1, 1), x, presence)
+        h = self.mab0(self.I.expand(batch_size, -1, -1), x, presence)
         return self.mab1(x, h)
 
 
@@ -168,7 +212,7 @@ class PMA(nn.Module):
 
     def forward(self, x, presence=None):
         batch_size = x.shape[0]
-        return self.mab(self.S.repeat(batch_size, 1, 1), x, presence)
+        return self.mab(self.S.expand(batch_size, -1, -1), x, presence)
 
 
 class SetTransformer(nn.Module):
@@ -219,5 +263,5 @@ class SetTransformer(nn.Module):
 
         z = self.fc2(h)
 
-        s = self.seeds.repeat(batch_size, 1, 1)
+        s = self.seeds.expand(batch_size, -1, -1)
         return self.multi_head_attention(s, z, z, presence)
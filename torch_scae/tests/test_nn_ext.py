@@ -0,0 +1,40 @@
+import unittest
+
+import torch
+
+from torch_scae.nn_ext import GroupedMLP, MLP
+
+
+class GroupedMLPTestCase(unittest.TestCase):
+    def helper(self, bias):
+        B = 24
+        G = 8
+        sizes = [16, 32, 10]
+
+        grouped_mlp = GroupedMLP(n_groups=G, sizes=sizes, bias=bias)
+        x = torch.rand(B, G, sizes[0])
+
+        with torch.no_grad():
+            out = grouped_mlp(x)
+
+            # compare to separate MLPs with the same parameters
+            for g in range(G):
+                mlp = MLP(sizes=sizes, bias=bias)
+                linears = [m for m in mlp if isinstance(m, torch.nn.Linear)]
+                for j, linear in enumerate(linears):
+                    linear.weight.copy_(grouped_mlp.weights[j][g].t())
+                    if bias:
+                        linear.bias.copy_(grouped_mlp.biases[j][g])
+                self.assertTrue(torch.allclose(out[:, g], mlp(x[:, g]), atol=1e-6))
+
+        self.assertTrue(out.shape == (B, G, sizes[-1]))
+
+    def test_with_bias(self):
+        self.helper(bias=True)
+
+    def test_without_bias(self):
+        self.helper(bias=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ import unittest
 import torch
 from monty.collections import AttrDict
 
-from torch_scae.object_decoder import CapsuleLayer, CapsuleLikelihood, CapsuleObjectDecoder
+from torch_scae.object_decoder import CapsuleLayer, CapsuleLikelihood, CapsuleObjectDecoder, \
+    gaussian_ll_sum
 
 
 class CapsuleLayerTestCase(unittest.TestCase):
@@ -58,6 +59,26 @@ class CapsuleLayerTestCase(unittest.TestCase):
             result.cpr_dynamic_reg_loss.shape == tuple()
         )
 
+    def test_capsule_layer_without_deformations(self):
+        B = 24
+        O = 8
+        F = 16
+        V = 10
+
+        capsule_layer = CapsuleLayer(n_caps=O, dim_feature=F, n_votes=V,
+                                     dim_caps=12, allow_deformations=False)
+        with torch.no_grad():
+            capsule_layer.cpr_static.uniform_(-1., 1.)
+        cpr_static = capsule_layer.cpr_static.detach().clone()
+
+        result = capsule_layer(torch.rand(B, O, F))
+        result.vote.sum().backward()
+
+        self.assertTrue(result.vote.shape == (B, O, V, 3, 3))
+        self.assertTrue(result.cpr_dynamic_reg_loss.shape == tuple())
+        self.assertTrue(torch.equal(capsule_layer.cpr_static, cpr_static))
+        self.assertTrue(capsule_layer.cpr_static.grad is not None)
+
 
 class CapsuleLikelihoodTestCase(unittest.TestCase):
     def test_capsule_likelihood(self):
@@ -111,6 +132,71 @@ class CapsuleLikelihoodTestCase(unittest.TestCase):
             result.mixing_log_prob.shape == (B, O + 1, V)
         )
 
+    def test_capsule_likelihood_without_aux(self):
+        B = 4
+        O = 5
+        V = 7
+        P = 6
+
+        capsule_likelihood = CapsuleLikelihood(
+            vote=torch.rand(B, O, V, P),
+            scale=torch.rand(B, O, V),
+            vote_presence=torch.rand(B, O, V),
+            dummy_vote=torch.rand(1, 1, V, P)
+        )
+        part_pose = torch.rand(B, V, P)
+        presence = torch.rand(B, V)
+
+        result = capsule_likelihood(part_pose, presence, compute_aux=False)
+        full_result = capsule_likelihood(part_pose, presence)
+
+        self.assertTrue(torch.allclose(result.log_prob, full_result.log_prob))
+        self.assertTrue('soft_winner' not in result)
+        self.assertTrue('posterior_mixing_prob' not in result)
+
+    def test_gaussian_ll_sum(self):
+        B = 4
+        O = 5
+        V = 7
+        P = 6
+
+        x = torch.rand(B, V, P)
+        vote = torch.rand(B, O, V, P)
+        scale = torch.rand(B, O, V) + 0.1
+
+        log_prob = gaussian_ll_sum(x, vote, scale)
+        expected = torch.distributions.Normal(vote, scale.unsqueeze(-1)) \
+            .log_prob(x.unsqueeze(1)).sum(-1)
+
+        self.assertTrue(log_prob.shape == (B, O, V))
+        self.assertTrue(torch.allclose(log_prob, expected, atol=1e-5))
+
+    def test_winner(self):
+        B = 4
+        O = 5
+        V = 7
+        P = 6
+
+        vote = torch.rand(B, O, V, P)
+        capsule_likelihood = CapsuleLikelihood(
+            vote=vote,
+            scale=torch.rand(B, O, V),
+            vote_presence=torch.rand(B, O, V),
+            dummy_vote=torch.rand(1, 1, V, P)
+        )
+        result = capsule_likelihood(torch.rand(B, V, P))
+
+        idx = result.posterior_mixing_prob.argmax(1)  # (B, V)
+        for b in range(B):
+            for m in range(V):
+                self.assertTrue(
+                    torch.equal(result.winner[b, m], vote[b, idx[b, m], m])
+                )
+                self.assertTrue(
+                    result.winner_presence[b, m]
+                    == capsule_likelihood.vote_presence[b, idx[b, m], m]
+                )
+
 
 class CapsuleObjectDecoderTestCase(unittest.TestCase):
     def test_capsule_likelihood(self):
@@ -1,5 +1,6 @@
 import unittest
 
+from .test_nn_ext import GroupedMLPTestCase
 from .test_object_decoder import CapsuleLayerTestCase, CapsuleLikelihoodTestCase, CapsuleObjectDecoderTestCase
 from .test_part_decoder import TemplateBasedImageDecoderTestCase, TemplateGeneratorTestCase
 from .test_part_encoder import CapsuleImageEncoderTestCase
@@ -13,6 +14,7 @@ def suite():
     test_suite.addTest(unittest.makeSuite(TemplateGeneratorTestCase))
     test_suite.addTest(unittest.makeSuite(TemplateBasedImageDecoderTestCase))
     test_suite.addTest(unittest.makeSuite(SetTransformerTestCase))
+    test_suite.addTest(unittest.makeSuite(GroupedMLPTestCase))
     test_suite.addTest(unittest.makeSuite(CapsuleLayerTestCase))
     test_suite.addTest(unittest.makeSuite(CapsuleLikelihoodTestCase))
     test_suite.addTest(unittest.makeSuite(CapsuleObjectDecoderTestCase))